@@ -1,17 +1,32 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from datetime import datetime
 import json
 
 class Database:
     def __init__(self):
-        self.conn = psycopg2.connect(
+        self.conn = self._connect()
+
+    def _connect(self):
+        return psycopg2.connect(
             database="api_analyzer",
             user="postgres",
             password="postgres",
             host="localhost",
             port="5432"
         )
+
+    def reconnect_if_closed(self):
+        """Reopen the connection if it was closed, e.g. terminated by reset.py; returns True if it did."""
+        if not self.conn.closed:
+            return False
+        self.conn = self._connect()
+        return True
+
+    def _rollback(self):
+        # End a failed transaction so later statements on this connection still work
+        if not self.conn.closed:
+            self.conn.rollback()
         
     def init_db(self):
         with self.conn.cursor() as cur:
@@ -66,46 +81,75 @@ class Database:
                 # Log the error but don't raise it
                 print(f"Database initialization warning: {str(e)}")
 
+    def _insert_file_record(self, cur, filename):
+        cur.execute(
+            "INSERT INTO uploaded_files (filename, upload_timestamp) VALUES (%s, %s) RETURNING id",
+            (filename, datetime.now())
+        )
+        return cur.fetchone()[0]
+
     def save_file_record(self, filename):
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "INSERT INTO uploaded_files (filename, upload_timestamp) VALUES (%s, %s) RETURNING id",
-                (filename, datetime.now())
-            )
-            file_id = cur.fetchone()['id']
+        with self.conn.cursor() as cur:
+            file_id = self._insert_file_record(cur, filename)
             self.conn.commit()
             return file_id
 
+    def _api_row(self, file_id, api_data):
+        # Convert all dictionary fields to JSON strings
+        parameters_json = json.dumps(api_data['parameters']) if api_data['parameters'] else '[]'
+        response_schemas_json = json.dumps(api_data['response_schemas']) if api_data['response_schemas'] else '{}'
+        
+        # Ensure request_body is a string (YAML or empty string)
+        request_body = api_data['request_body'] if isinstance(api_data['request_body'], str) else ''
+        
+        return (file_id, 
+                api_data['name'], 
+                api_data['method'], 
+                api_data['summary'],
+                api_data['description'], 
+                parameters_json,
+                request_body,  # Already a YAML string
+                response_schemas_json,
+                api_data.get('base_url', ''), 
+                api_data.get('full_path', ''))
+
     def save_api_data(self, file_id, api_data):
         with self.conn.cursor() as cur:
-            # Convert all dictionary fields to JSON strings
-            parameters_json = json.dumps(api_data['parameters']) if api_data['parameters'] else '[]'
-            response_schemas_json = json.dumps(api_data['response_schemas']) if api_data['response_schemas'] else '{}'
-            tags_json = json.dumps(api_data['tags']) if api_data['tags'] else '[]'
-            
-            # Ensure request_body is a string (YAML or empty string)
-            request_body = api_data['request_body'] if isinstance(api_data['request_body'], str) else ''
-            
-            cur.execute(
+            self._insert_api_rows(cur, file_id, [api_data])
+            self.conn.commit()
+
+    def _insert_api_rows(self, cur, file_id, api_list):
+        rows = [self._api_row(file_id, api_data) for api_data in api_list]
+        if rows:
+            execute_values(
+                cur,
                 """INSERT INTO apis (file_id, api_name, method, summary, description, parameters, request_body, response_schemas, base_url, full_path)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (file_id, 
-                 api_data['name'], 
-                 api_data['method'], 
-                 api_data['summary'],
-                 api_data['description'], 
-                 parameters_json,
-                 request_body,  # Already a YAML string
-                 response_schemas_json,
-                 api_data.get('base_url', ''), 
-                 api_data.get('full_path', ''))
+                   VALUES %s""",
+                rows,
+                page_size=500
             )
+
+    def save_file_with_apis(self, filename, api_list):
+        """Insert a file record and all of its APIs in a single transaction; returns the file id."""
+        try:
+            with self.conn.cursor() as cur:
+                file_id = self._insert_file_record(cur, filename)
+                self._insert_api_rows(cur, file_id, api_list)
             self.conn.commit()
+        except Exception:
+            # Don't leave a file record without its APIs
+            self._rollback()
+            raise
+        return file_id
 
     def get_uploaded_files(self):
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM uploaded_files ORDER BY upload_timestamp DESC")
-            return cur.fetchall()
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("SELECT * FROM uploaded_files ORDER BY upload_timestamp DESC")
+                return cur.fetchall()
+        except Exception:
+            self._rollback()
+            raise
 
     def save_query_history(self, query, response):
         with self.conn.cursor() as cur:
@@ -116,6 +160,10 @@ class Database:
             self.conn.commit()
 
     def get_query_history(self):
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM query_history ORDER BY timestamp DESC")
-            return cur.fetchall()
\ No newline at end of file
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("SELECT * FROM query_history ORDER BY timestamp DESC")
+                return cur.fetchall()
+        except Exception:
+            self._rollback()
+            raise
\ No newline at end of file
@@ -1,28 +1,128 @@
 import yaml
+import json
 import os
-from datetime import datetime
+import hashlib
+import pickle
+import tempfile
+import time
+
+# Prefer the libyaml-backed loader/dumper; they are much faster on large specs
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+class SchemaDumper(SafeDumper):
+    """Write shared sub-schemas inline instead of as YAML anchors/aliases."""
+    def ignore_aliases(self, data):
+        return True
+
+def _is_cyclic(node, ancestors=None, acyclic=None):
+    """Return True if a dict/list contains itself, e.g. through a recursive YAML anchor."""
+    if not isinstance(node, (dict, list)):
+        return False
+    if ancestors is None:
+        ancestors, acyclic = set(), set()
+    node_id = id(node)
+    if node_id in ancestors:
+        return True
+    if node_id in acyclic:
+        return False
+    ancestors.add(node_id)
+    children = node.values() if isinstance(node, dict) else node
+    found = any(_is_cyclic(child, ancestors, acyclic) for child in children)
+    ancestors.discard(node_id)
+    if not found:
+        acyclic.add(node_id)
+    return found
+
+def dump_schema(schema, sort_keys=True):
+    """Render a schema as YAML, inlining shared sub-schemas unless that would recurse forever."""
+    # Recursive schemas can only be written with anchors/aliases
+    dumper = SafeDumper if _is_cyclic(schema) else SchemaDumper
+    return yaml.dump(schema, Dumper=dumper, default_flow_style=False, sort_keys=sort_keys)
+
+# Path item keys that hold operations; others (parameters, servers, x-*) are skipped
+HTTP_METHODS = frozenset(('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace'))
+
+# Placeholder stored in a ref cache while that $ref is being resolved
+_RESOLVING = object()
+
+SCHEMA_REF_PREFIX = '#/components/schemas/'
+
+# Bump whenever parse_yaml output changes so stale cache entries are ignored
+PARSE_CACHE_VERSION = 6
 
 class FileProcessor:
     def __init__(self, upload_dir="uploads"):
         self.upload_dir = upload_dir
-        os.makedirs(upload_dir, exist_ok=True)
+        self.cache_dir = os.path.join(upload_dir, ".cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
 
     def process_uploaded_file(self, uploaded_file):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         filename = f"{timestamp}_{uploaded_file.name}"
         file_path = os.path.join(self.upload_dir, filename)
+        # getbuffer() lets the file write and the cache hash read the upload in place;
+        # parsing still takes one bytes copy, since the decoders don't accept a memoryview
+        content = uploaded_file.getbuffer()
         
         with open(file_path, 'wb') as f:
-            f.write(uploaded_file.getvalue())
+            f.write(content)
         
-        return self.parse_yaml(file_path), filename
+        return self.parse_yaml_cached(content), filename
+
+    def parse_yaml_cached(self, content):
+        """Parse a spec, reusing the cached result for identical file contents."""
+        digest = hashlib.sha256(content).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{digest}_v{PARSE_CACHE_VERSION}.pkl")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    return pickle.load(f)
+            except Exception as e:
+                print(f"Ignoring unreadable parse cache {cache_path}: {str(e)}")
+
+        apis = self.parse_yaml_content(content)
+        # Write to a temp file and rename so a concurrent reader never sees a partial pickle
+        f = None
+        try:
+            with tempfile.NamedTemporaryFile('wb', dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+                pickle.dump(apis, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, cache_path)
+        except Exception as e:
+            # The cache is only an optimisation; don't fail the upload over it
+            print(f"Could not write parse cache {cache_path}: {str(e)}")
+            if f is not None and os.path.exists(f.name):
+                os.unlink(f.name)
+        return apis
+
+    def resolve_schema_reference(self, ref, components, ref_cache=None):
+        """Resolve a schema reference recursively.
 
-    def resolve_schema_reference(self, ref, components):
-        """Resolve a schema reference recursively."""
-        if not ref or not isinstance(ref, str) or not ref.startswith('#/components/schemas/'):
+        ref_cache memoizes resolutions across one spec parse and guards
+        against self-referential schemas.
+        """
+        if not ref or not isinstance(ref, str) or not ref.startswith(SCHEMA_REF_PREFIX):
             return ref
 
-        schema_name = ref.split('/')[-1]
+        if ref_cache is None:
+            ref_cache = {}
+        cached = ref_cache.get(ref)
+        if cached is _RESOLVING:
+            # Cyclic reference: leave the inner $ref unresolved
+            return ref
+        if cached is not None:
+            return cached
+
+        ref_cache[ref] = _RESOLVING
+        resolved = self._resolve_schema_reference(ref, components, ref_cache)
+        ref_cache[ref] = resolved
+        return resolved
+
+    def _resolve_schema_reference(self, ref, components, ref_cache):
+        # Undo JSON-pointer escaping; ~1 must be replaced before ~0
+        schema_name = ref[len(SCHEMA_REF_PREFIX):].replace('~1', '/').replace('~0', '~')
         schema = components.get('schemas', {}).get(schema_name, {})
         
         if not schema:
@@ -30,15 +130,7 @@ class FileProcessor:
 
         # Handle allOf references
         if 'allOf' in schema:
-            resolved_schema = {}
-            for item in schema['allOf']:
-                if isinstance(item, dict) and '$ref' in item:
-                    ref_schema = self.resolve_schema_reference(item['$ref'], components)
-                    if isinstance(ref_schema, dict):
-                        resolved_schema.update(ref_schema)
-                elif isinstance(item, dict):
-                    resolved_schema.update(item)
-            return resolved_schema
+            return self._merge_all_of(schema['allOf'], components, ref_cache)
 
         # Handle direct schema definitions
         resolved_schema = {}
@@ -47,39 +139,102 @@ class FileProcessor:
                 resolved_schema['properties'] = {}
                 for prop_name, prop_value in value.items():
                     if isinstance(prop_value, dict) and '$ref' in prop_value:
-                        resolved_schema['properties'][prop_name] = self.resolve_schema_reference(prop_value['$ref'], components)
+                        resolved_schema['properties'][prop_name] = self.resolve_schema_reference(prop_value['$ref'], components, ref_cache)
                     else:
                         resolved_schema['properties'][prop_name] = prop_value
             elif isinstance(value, dict) and '$ref' in value:
-                resolved_schema[key] = self.resolve_schema_reference(value['$ref'], components)
+                resolved_schema[key] = self.resolve_schema_reference(value['$ref'], components, ref_cache)
             else:
                 resolved_schema[key] = value
 
         return resolved_schema
 
-    def resolve_response_schema(self, schema, components):
-        """Resolve response schema references recursively."""
+    def _merge_all_of(self, items, components, ref_cache):
+        """Merge allOf sub-schemas, combining their properties and required lists."""
+        merged = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            if '$ref' in item:
+                item = self.resolve_schema_reference(item['$ref'], components, ref_cache)
+                if not isinstance(item, dict):
+                    continue
+            for key, value in item.items():
+                if key == 'properties' and isinstance(value, dict):
+                    merged['properties'] = {**merged.get('properties', {}), **value}
+                elif key == 'required' and isinstance(value, list):
+                    required = merged.setdefault('required', [])
+                    required.extend(name for name in value if name not in required)
+                else:
+                    merged[key] = value
+        return merged
+
+    def resolve_response_schema(self, schema, components, ref_cache=None):
+        """Resolve response schema references, following nested array items."""
         if not schema:
             return schema
+        if isinstance(schema, list):
+            return [self.resolve_response_schema(item, components, ref_cache) for item in schema]
+        if not isinstance(schema, dict):
+            return schema
 
-        if isinstance(schema, dict):
-            resolved = {}
-            for key, value in schema.items():
-                if key == '$ref':
-                    return self.resolve_schema_reference(value, components)
-                elif key == 'items' and isinstance(value, dict):
-                    resolved[key] = self.resolve_response_schema(value, components)
-                else:
-                    resolved[key] = value
-            return resolved
-        elif isinstance(schema, list):
-            return [self.resolve_response_schema(item, components) for item in schema]
-        
-        return schema
+        # Walk the chain of nested `items` in a loop, copying each dict on the
+        # way so the innermost $ref can be replaced without touching the spec
+        root = {}
+        parent = root
+        node = schema
+        seen = set()
+        while True:
+            # YAML anchors can make `items` point back at an enclosing schema
+            if id(node) in seen:
+                raise ValueError("Invalid schema: cyclic 'items' chain")
+            seen.add(id(node))
+            if node and '$ref' in node:
+                parent['items'] = self.resolve_schema_reference(node['$ref'], components, ref_cache)
+                break
+            items = node.get('items')
+            if not isinstance(items, dict):
+                parent['items'] = node
+                break
+            node_copy = dict(node)
+            parent['items'] = node_copy
+            parent = node_copy
+            node = items
+        return root['items']
+
+    def normalize_param(self, param):
+        """Reduce a parameter object to the fields the app uses."""
+        return {
+            'name': param.get('name', ''),
+            'in': param.get('in', ''),
+            'description': param.get('description', ''),
+            'required': param.get('required', False),
+            'schema': param.get('schema', {})
+        }
 
     def parse_yaml(self, file_path):
-        with open(file_path, 'r') as f:
-            data = yaml.safe_load(f)
+        # Read bytes so the JSON or YAML decoder handles the encoding itself
+        with open(file_path, 'rb') as f:
+            data = self._load_spec(f.read())
+
+        return self._parse_spec(data)
+
+    def parse_yaml_content(self, content):
+        """Parse a spec from bytes already in memory, e.g. a fresh upload."""
+        # libyaml needs bytes rather than a memoryview
+        return self._parse_spec(self._load_spec(bytes(content)))
+
+    def _load_spec(self, raw):
+        """Decode spec bytes; JSON documents skip the much slower YAML parser."""
+        if raw.lstrip()[:1] == b'{':
+            try:
+                return json.loads(raw)
+            except ValueError:
+                # A YAML flow mapping rather than strict JSON
+                pass
+        return yaml.load(raw, Loader=SafeLoader)
+
+    def _parse_spec(self, data):
         
         if not isinstance(data, dict):
             raise ValueError("Invalid YAML: File must contain a dictionary")
@@ -97,16 +252,28 @@ class FileProcessor:
         # Get server URL
         servers = data.get('servers', [])
         base_url = servers[0].get('url', '') if servers else ''
+        # Normalize the base once instead of per operation
+        url_prefix = base_url.rstrip('/')
         
         # Get components for schema resolution
         components = data.get('components', {})
+        # Specs reference the same components from many operations; resolve each once
+        ref_cache = {}
         
         # Process paths
         paths = data.get('paths', {})
         for path, path_item in paths.items():
+            # Path-level parameters are shared by every operation under this path
+            path_parameters = path_item.get('parameters', [])
+            path_parameters = path_parameters if isinstance(path_parameters, list) else []
+            path_parameters = [self.normalize_param(p) for p in path_parameters]
+            path_params_by_key = {}
+            for index, param in enumerate(path_parameters):
+                path_params_by_key.setdefault((param['name'], param['in']), index)
+
             for method, method_data in path_item.items():
-                # Skip if method_data is not a dict (e.g., if it's a list or something else)
-                if not isinstance(method_data, dict):
+                # Skip non-operation keys and anything that is not a dict
+                if method.lower() not in HTTP_METHODS or not isinstance(method_data, dict):
                     continue
                 operation_id = method_data.get('operationId', None)
                 summary = method_data.get('summary', '')
@@ -114,32 +281,22 @@ class FileProcessor:
                 tags = method_data.get('tags', [])
 
                 # Extract parameters
-                path_parameters = path_item.get('parameters', [])
                 operation_parameters = method_data.get('parameters', [])
                 operation_parameters = operation_parameters if isinstance(operation_parameters, list) else []
-                path_parameters = path_parameters if isinstance(path_parameters, list) else []
-                # Normalize parameter dicts
-                def normalize_param(param):
-                    return {
-                        'name': param.get('name', ''),
-                        'in': param.get('in', ''),
-                        'description': param.get('description', ''),
-                        'required': param.get('required', False),
-                        'schema': param.get('schema', {})
-                    }
-                operation_parameters = [normalize_param(p) for p in operation_parameters]
-                path_parameters = [normalize_param(p) for p in path_parameters]
-
-                # Combine path and operation parameters
+                operation_parameters = [self.normalize_param(p) for p in operation_parameters]
+
+                # Combine path and operation parameters; operation-level entries
+                # override path-level ones with the same (name, in)
                 all_parameters = path_parameters.copy()
+                params_by_key = path_params_by_key.copy() if operation_parameters else path_params_by_key
                 for op_param in operation_parameters:
-                    existing_param = next(
-                        (p for p in all_parameters if p['name'] == op_param['name'] and p['in'] == op_param['in']),
-                        None
-                    )
-                    if existing_param:
-                        existing_param.update(op_param)
+                    key = (op_param['name'], op_param['in'])
+                    index = params_by_key.get(key)
+                    if index is not None:
+                        # Merge into a copy so the shared path-level entry stays intact
+                        all_parameters[index] = {**all_parameters[index], **op_param}
                     else:
+                        params_by_key[key] = len(all_parameters)
                         all_parameters.append(op_param)
 
                 # Extract request body
@@ -149,15 +306,15 @@ class FileProcessor:
                     if 'application/json' in content:
                         request_body = content['application/json'].get('schema', {})
                         if isinstance(request_body, dict) and '$ref' in request_body:
-                            request_body = self.resolve_schema_reference(request_body['$ref'], components)
+                            request_body = self.resolve_schema_reference(request_body['$ref'], components, ref_cache)
                         # Convert request body to YAML string
-                        request_body = yaml.dump(request_body, default_flow_style=False, sort_keys=False)
+                        request_body = dump_schema(request_body, sort_keys=False)
                     elif 'application/yaml' in content:
                         request_body = content['application/yaml'].get('schema', {})
                         if isinstance(request_body, dict) and '$ref' in request_body:
-                            request_body = self.resolve_schema_reference(request_body['$ref'], components)
+                            request_body = self.resolve_schema_reference(request_body['$ref'], components, ref_cache)
                         # Keep as YAML string
-                        request_body = yaml.dump(request_body, default_flow_style=False, sort_keys=False)
+                        request_body = dump_schema(request_body, sort_keys=False)
 
                 # Extract and resolve response schemas
                 response_schemas = {}
@@ -167,16 +324,16 @@ class FileProcessor:
                         schema = {}
                         if 'application/json' in content:
                             schema = content['application/json'].get('schema', {})
-                            schema = self.resolve_response_schema(schema, components)
+                            schema = self.resolve_response_schema(schema, components, ref_cache)
                             # Convert response schema to YAML string
-                            schema = yaml.dump(schema, default_flow_style=False)
+                            schema = dump_schema(schema)
                         response_schemas[status_code] = {
                             'description': response_data.get('description', ''),
                             'schema': schema
                         }
 
                 # Create full API path by combining base URL and path
-                full_path = f"{base_url.rstrip('/')}/{path.lstrip('/')}" if base_url else path
+                full_path = f"{url_prefix}/{path.lstrip('/')}" if base_url else path
 
                 # Create API dictionary
                 api_dict = {
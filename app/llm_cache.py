@@ -0,0 +1,68 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+class LLMCache:
+    """Thread-safe LRU of LLM replies keyed by model and messages."""
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # Futures for calls still in progress, keyed like the entries
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash JSON-serialisable request parts (model, messages, options) into a cache key."""
+        payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached reply for key, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Store a reply, evicting the least recently used entries over maxsize."""
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_or_call(self, key, call):
+        """Return the cached reply, or run call() once even if several threads ask at the same time."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+            # Identical requests already being answered wait for that call instead
+            pending = self._inflight.get(key)
+            if pending is None:
+                future = self._inflight[key] = Future()
+        if pending is not None:
+            return pending.result()
+
+        try:
+            value = call()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._store(key, value)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
@@ -1,119 +1,82 @@
 import ollama
 from app.database import Database
 import json
-import re
-import yaml
 import logging
+from app.llm_cache import LLMCache
+
+logger = logging.getLogger(__name__)
+
+# Keep models resident in Ollama between sporadic queries (default unload is 5 minutes)
+KEEP_ALIVE = "24h"
+
+# Fixed instruction text appended after the per-query part of the tool-selection prompt
+TOOL_SELECT_TAIL = """Based on the user query and available tools, select the best tool to call.\nReturn ONLY a JSON object in the following format:\n{\n  \"tool_name\": <tool_name>,\n  \"parameters\": {<param_name>: <value>, ...},\n  \"request_body\": <dict or null>\n}\nIf no tool matches, return an empty JSON object {}.\n\nExamples:\nSimple:\n{\n  \"tool_name\": \"GET__accounts\",\n  \"parameters\": {\"skip\": 0, \"limit\": 10},\n  \"request_body\": null\n}\nComplex:\n{\n  \"tool_name\": \"POST__accounts\",\n  \"parameters\": {},\n  \"request_body\": {\n    \"name\": \"Acme Corporation\",\n    \"address_line1\": \"123 Main St\",\n    \"address_line2\": \"Suite 456\",\n    \"city\": \"Anytown\",\n    \"state\": \"CA\",\n    \"zip_code\": \"90210\"\n  }\n}\n\nReturn ONLY the JSON object, and nothing else. Do not include any explanation, Markdown, or extra text.\n"""
+
+TRUE_STRINGS = frozenset(('true', '1', 'yes'))
+FALSE_STRINGS = frozenset(('false', '0', 'no'))
+
+def to_bool(value):
+    """Convert common true/false spellings to bool; raise ValueError otherwise."""
+    text = str(value).lower()
+    if text in TRUE_STRINGS:
+        return True
+    if text in FALSE_STRINGS:
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+# Schema type -> (expected Python type, caster) for tool-call parameters
+PARAM_CASTERS = {
+    'integer': (int, int),
+    'number': (float, float),
+    'boolean': (bool, to_bool),
+}
 
 class LLMHandler:
-    def __init__(self):
+    # Replies shared by all handlers, keyed by model, messages and options.
+    # Prompts embed every tool's metadata, so new tools never hit stale entries.
+    llm_cache = LLMCache(maxsize=1000)
+
+    def __init__(self, db=None):
         # Initialize the model and database
         self.model = "llama3-groq-tool-use"
-        self.db = Database()
+        # One client per handler keeps the HTTP connection to Ollama alive between calls
+        self.client = ollama.Client()
+        # Reuse the caller's connection instead of opening a second one
+        self.db = db if db is not None else Database()
         self._tool_registry = None
+        self._tools_snapshot = {}
+        self._tool_infos = []
+        self._prompt_prefix = ""
 
-    def set_tools(self, tool_registry):
-        # Set the tool registry
-        self._tool_registry = tool_registry
-
-    def _replace_url_parameters(self, full_path, query):
-        """
-        Replace URL parameters in the full path with values extracted from the query.
-        Returns the modified path and any extracted parameters.
-        """
-        # Extract URL parameters using regex
-        url_param_matches = re.findall(r'\{([^{}]*)\}', full_path)
-        if not url_param_matches:
-            return full_path, {}
-        
-        # Create a prompt to extract parameter values from the query
-        param_prompt = f"""Given the following query and URL parameters, extract the values for each parameter.
-        
-Query: {query}
-URL Parameters: {', '.join(url_param_matches)}
-
-Return a JSON object with parameter names and their values. If a value cannot be determined, use null.
-Example format:
-{{
-    "parameter_name": "extracted_value"
-}}
-"""
-        # Get parameter values from LLM
-        response = ollama.chat(
-            model="llama3-groq-tool-use",
-            messages=[
-                {'role': 'system', 'content': 'You are a parameter extractor. Extract values for URL parameters from the given query.'},
-                {'role': 'user', 'content': param_prompt}
-            ],
-            options={"temperature": 0.0}
-        )
-        try:
-            param_values = json.loads(response['message']['content'])
-        except json.JSONDecodeError:
-            param_values = {}
-        
-        # Replace parameters in the URL
-        modified_path = full_path
-        for param_name in url_param_matches:
-            clean_param_name = param_name.strip('{}')
-            param_value = param_values.get(clean_param_name)
-            if param_value is not None:
-                modified_path = re.sub(r'\{' + param_name + r'\}', str(param_value), modified_path)
-        
-        return modified_path, param_values
+    def preload(self):
+        """Load the tool-selection and explanation models so the first query skips the cold start.
 
-    def _extract_request_body(self, request_body_schema, query):
-        """
-        Extract request body values from the query based on the schema.
-        Returns the populated request body JSON.
+        Returns True if every model loaded.
         """
-        # Check if the request body schema is empty
-        if not request_body_schema:
-            return {}
-        
-        try:
-            # Parse YAML schema to dict
-            schema_dict = yaml.safe_load(request_body_schema)
-        except yaml.YAMLError:
-            return {}
-        
-        # Create a prompt to extract request body values
-        schema_prompt = f"""Given the following query and request body schema, extract the values for each field.
-        
-Query: {query}
-Request Body Schema:
-{yaml.dump(schema_dict, default_flow_style=False)}
-
-Return a JSON object with field names and their values. Only include fields that have values in the query.
-Example format:
-{{
-    "field_name": "extracted_value"
-}}
-"""
-        # Get request body values from LLM
-        response = ollama.chat(
-            model="llama3-groq-tool-use",
-            messages=[
-                {'role': 'system', 'content': 'You are a request body extractor. Extract values for request body fields from the given query.'},
-                {'role': 'user', 'content': schema_prompt}
-            ],
-            options={"temperature": 0.0}
-        )
-        try:
-            return json.loads(response['message']['content'])
-        except json.JSONDecodeError:
-            return {}
-
-    def get_response(self, query, tools=None):
-        """Get response from LLM and find relevant API using dynamic tools."""
-        if tools is not None:
-            self.set_tools(tools)
-        if not self._tool_registry:
-            return "No tools available for query."
+        loaded = True
+        for model in (self.model, "llama3.1"):
+            try:
+                # An empty chat only loads the model; nothing is generated
+                self.client.chat(model=model, messages=[], keep_alive=KEEP_ALIVE)
+            except Exception as e:
+                logger.warning("Failed to preload model %s: %s", model, e)
+                loaded = False
+        return loaded
 
+    def set_tools(self, tool_registry):
+        # Set the tool registry
+        self._tool_registry = tool_registry
+        # Tool metadata only changes when tools are added, so rebuild the prompt lazily
+        tools = tool_registry or {}
+        if tools != self._tools_snapshot:
+            self._tools_snapshot = dict(tools)
+            self._build_tool_prompt()
+
+    def _build_tool_prompt(self):
+        """Collect tool metadata and render the tool section of the selection prompt."""
         # Gather tool metadata for LLM prompt
         tool_infos = []
-        for tool_name, tool_func in self._tool_registry.items():
+        for tool_name, tool_func in self._tools_snapshot.items():
             api = getattr(tool_func, '__api_metadata__', None)
             if api is None:
                 # Fallback: try to get from main's tool_registry
@@ -141,70 +104,65 @@ Example format:
             }
             tool_infos.append(info)
 
-        if not tool_infos:
-            return f"No tool metadata found. Tool registry: {list(self._tool_registry.keys())}"
+        self._tool_infos = tool_infos
 
         # Build LLM prompt
-        prompt = """You are an API assistant. You have access to the following API tools.\n"""
+        parts = ["""You are an API assistant. You have access to the following API tools.\n"""]
         for tool in tool_infos:
-            prompt += f"\nTool Name: {tool['tool_name']}\nMethod: {tool['method']}\nPath: {tool['path']}\nSummary: {tool['summary']}\nDescription: {tool['description']}\nParameters: {tool['parameters']}"
+            parts.append(f"\nTool Name: {tool['tool_name']}\nMethod: {tool['method']}\nPath: {tool['path']}\nSummary: {tool['summary']}\nDescription: {tool['description']}\nParameters: {tool['parameters']}")
             if tool['request_body']:
-                prompt += f"\nRequest Body Schema: {tool['request_body']}"
-            prompt += "\n---"
-        prompt += f"\n\nUser Query: {query}\n\n"
-        prompt += """Based on the user query and available tools, select the best tool to call.\nReturn ONLY a JSON object in the following format:\n{\n  \"tool_name\": <tool_name>,\n  \"parameters\": {<param_name>: <value>, ...},\n  \"request_body\": <dict or null>\n}\nIf no tool matches, return null.\n\nExamples:\nSimple:\n{\n  \"tool_name\": \"GET__accounts\",\n  \"parameters\": {\"skip\": 0, \"limit\": 10},\n  \"request_body\": null\n}\nComplex:\n{\n  \"tool_name\": \"POST__accounts\",\n  \"parameters\": {},\n  \"request_body\": {\n    \"name\": \"Acme Corporation\",\n    \"address_line1\": \"123 Main St\",\n    \"address_line2\": \"Suite 456\",\n    \"city\": \"Anytown\",\n    \"state\": \"CA\",\n    \"zip_code\": \"90210\"\n  }\n}\n\nReturn ONLY the JSON object, and nothing else. Do not include any explanation, Markdown, or extra text.\n"""
+                parts.append(f"\nRequest Body Schema: {tool['request_body']}")
+            parts.append("\n---")
+        self._prompt_prefix = "".join(parts)
+
+    def _chat_cached(self, model, messages, **kwargs):
+        """Run a non-streaming chat call through the shared reply cache and return its text."""
+        key = self.llm_cache.make_key(model, messages, kwargs)
+        return self.llm_cache.get_or_call(
+            key, lambda: self.client.chat(model=model, messages=messages, keep_alive=KEEP_ALIVE, **kwargs)['message']['content']
+        )
 
-        # Call LLM
-        response = ollama.chat(
-            model="llama3-groq-tool-use",
-            messages=[
+    def _select_tool(self, prompt):
+        """Return the raw tool-selection reply, cached per prompt."""
+        return self._chat_cached(
+            "llama3-groq-tool-use",
+            [
                 {'role': 'system', 'content': 'You are an API assistant.'},
                 {'role': 'user', 'content': prompt}
             ],
-            options={"temperature": 0.0}
+            # JSON mode constrains decoding, so the reply parses without scanning;
+            # the cap leaves room for a full request body but stops runaway generations
+            format="json",
+            options={"temperature": 0.0, "num_predict": 512}
         )
-        try:
-            content = response['message']['content'].strip()
-            logging.info(f"Raw LLM response: {content}")
 
-            # Extract all complete JSON objects using brace counting
-            def extract_all_json(text):
-                results = []
-                i = 0
-                while i < len(text):
-                    if text[i] == '{':
-                        start = i
-                        brace_count = 1
-                        i += 1
-                        while i < len(text) and brace_count > 0:
-                            if text[i] == '{':
-                                brace_count += 1
-                            elif text[i] == '}':
-                                brace_count -= 1
-                            i += 1
-                        if brace_count == 0:
-                            results.append(text[start:i])
-                        else:
-                            break
-                    else:
-                        i += 1
-                return results
+    def get_response(self, query, tools=None):
+        """Get response from LLM and find relevant API using dynamic tools."""
+        # Collapse whitespace so trivially different queries share a cache entry
+        query = ' '.join(query.split())
+        # Re-sync even without new tools: the registry dict may have grown in place
+        self.set_tools(tools if tools is not None else self._tool_registry)
+        if not self._tool_registry:
+            return "No tools available for query."
+
+        if not self._tool_infos:
+            return f"No tool metadata found. Tool registry: {list(self._tool_registry.keys())}"
 
-            json_candidates = extract_all_json(content)
-            logging.info(f"JSON candidates found: {json_candidates}")
-            result = None
-            json_str = None
-            for candidate in json_candidates:
-                try:
-                    result = json.loads(candidate)
-                    json_str = candidate
-                    break
-                except Exception as parse_exc:
-                    logging.info(f"Candidate failed JSON parsing: {candidate} | Error: {parse_exc}")
-            if result is None:
-                logging.error(f"No valid JSON object found in LLM response. Candidates: {json_candidates}")
+        prompt = f"{self._prompt_prefix}\n\nUser Query: {query}\n\n{TOOL_SELECT_TAIL}"
+
+        # Call LLM (or reuse the reply to an identical prompt)
+        raw_content = self._select_tool(prompt)
+        try:
+            content = raw_content.strip()
+            logger.debug("Raw LLM response: %s", content)
+
+            try:
+                result = json.loads(content)
+            except json.JSONDecodeError as parse_exc:
+                logger.error("LLM response is not valid JSON: %s", parse_exc)
+                result = None
+            if not isinstance(result, dict):
                 return f"No valid JSON object found in LLM response. The LLM likely returned an explanation or list instead of a JSON object. Please rephrase your query or check the API schema.\nRaw response: {content}"
-            logging.info(f"Extracted JSON string: {json_str}")
             if not result:
                 return "No matching API tool found for your query."
             tool_name = result.get('tool_name')
@@ -212,80 +170,76 @@ Example format:
             request_body = result.get('request_body', None)
             tool_func = self._tool_registry.get(tool_name)
             if tool_func is None:
-                logging.error(f"Tool '{tool_name}' not found. Registry: {list(self._tool_registry.keys())}")
+                logger.error("Tool '%s' not found. Registry: %s", tool_name, list(self._tool_registry.keys()))
                 return f"Tool '{tool_name}' not found."
-            # Cast parameter types based on API metadata
-            api_meta = getattr(tool_func, '__api_metadata__', None)
-            if api_meta:
+            # Cast parameter types based on API metadata; main attaches the schemas at registration
+            param_schemas = getattr(tool_func, '__param_schemas__', None)
+            if param_schemas is None:
+                api_meta = getattr(tool_func, '__api_metadata__', None) or {}
                 param_schemas = {p['name']: p.get('schema', {}) for p in api_meta.get('parameters', [])}
-                for k, v in params.items():
-                    schema = param_schemas.get(k, {})
-                    expected_type = schema.get('type')
-                    if expected_type == 'integer' and not isinstance(v, int):
-                        try:
-                            params[k] = int(v)
-                            logging.info(f"Casted parameter '{k}' to int: {params[k]}")
-                        except Exception as e:
-                            logging.warning(f"Failed to cast parameter '{k}' value '{v}' to int: {e}")
-                    elif expected_type == 'number' and not isinstance(v, float):
-                        try:
-                            params[k] = float(v)
-                            logging.info(f"Casted parameter '{k}' to float: {params[k]}")
-                        except Exception as e:
-                            logging.warning(f"Failed to cast parameter '{k}' value '{v}' to float: {e}")
-                    elif expected_type == 'boolean' and not isinstance(v, bool):
-                        try:
-                            if str(v).lower() in ['true', '1', 'yes']:
-                                params[k] = True
-                            elif str(v).lower() in ['false', '0', 'no']:
-                                params[k] = False
-                            logging.info(f"Casted parameter '{k}' to bool: {params[k]}")
-                        except Exception as e:
-                            logging.warning(f"Failed to cast parameter '{k}' value '{v}' to bool: {e}")
+            for k, v in params.items():
+                expected_type = param_schemas.get(k, {}).get('type')
+                caster = PARAM_CASTERS.get(expected_type)
+                if caster is None or isinstance(v, caster[0]):
+                    continue
+                target, cast = caster
+                try:
+                    params[k] = cast(v)
+                    logger.info("Casted parameter '%s' to %s: %s", k, target.__name__, params[k])
+                except Exception as e:
+                    logger.warning("Failed to cast parameter '%s' value '%s' to %s: %s", k, v, target.__name__, e)
             # Call the selected tool
             kwargs = params.copy()
             if request_body:
                 kwargs['request_body'] = request_body
             api_result = tool_func(**kwargs)
-            logging.info(f"Tool called: {tool_name} | Result: {api_result}")
-            return f"Tool called: {tool_name}\nResult: {api_result}"
+            logger.info("Tool called: %s | Result: %s", tool_name, api_result)
+            # Serialize as JSON so the UI can parse the result in one step
+            return f"Tool called: {tool_name}\nResult: {json.dumps(api_result, default=str)}"
         except Exception as e:
-            logging.error(f"General error in get_response: {e}")
-            return f"Error processing LLM response: {str(e)}\nRaw response: {response['message']['content']}"
-
-    def _format_api_response(self, api_data, query):
-        # ... (existing code, unchanged)
-        pass
-
-    def _extract_parameter_value(self, query, param_name):
-        # ... (existing code, unchanged)
-        pass
+            logger.error("General error in get_response: %s", e)
+            return f"Error processing LLM response: {str(e)}\nRaw response: {raw_content}"
 
-    def _extract_request_body_values(self, query, request_body):
-        # ... (existing code, unchanged)
-        pass
-
-    def get_history(self):
-        # Return query history from database
-        return self.db.get_query_history()
-
-    def explain_api_response(self, api_response):
-        """Explain API response in plain English."""
+    def explain_api_response_stream(self, api_response):
+        """Explain API response in plain English, yielding text as it is generated."""
+        parts = []
         try:
             # Format the response for the LLM
-            response_text = f"""API Response:\nStatus Code: {api_response.get('status_code')}\nHeaders: {json.dumps(api_response.get('headers', {}) , indent=2)}\nBody: {json.dumps(api_response.get('body', {}), indent=2)}\n"""
+            response_text = f"""API Response:\nStatus Code: {api_response.get('status_code')}\nHeaders: {json.dumps(api_response.get('headers', {}), separators=(',', ':'))}\nBody: {json.dumps(api_response.get('body', {}), separators=(',', ':'))}\n"""
             # Create prompt for explanation
             prompt = f"""Please explain the following API response in plain English. \nFocus on explaining what the response means and any important information it contains.\nKeep the explanation concise but informative.\n\n{response_text}\n\nExplanation:"""
-            # Get explanation from LLM
-            response = ollama.chat(
+            messages = [
+                {'role': 'system', 'content': 'You are an API response explainer. Explain API responses in clear, plain English.'},
+                {'role': 'user', 'content': prompt}
+            ]
+            # A concise explanation fits well within this cap
+            options = {"temperature": 0.0, "num_predict": 512}
+            key = self.llm_cache.make_key("llama3.1", messages, {'options': options})
+            cached = self.llm_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+            # Stream the explanation so the UI can render the first tokens right away
+            stream = self.client.chat(
                 model="llama3.1",
-                messages=[
-                    {'role': 'system', 'content': 'You are an API response explainer. Explain API responses in clear, plain English.'},
-                    {'role': 'user', 'content': prompt}
-                ],
-                options={"temperature": 0.0}
+                messages=messages,
+                options=options,
+                keep_alive=KEEP_ALIVE,
+                stream=True
             )
-            return response['message']['content'].strip()
-        except Exception as e:
-            print(f"Error explaining API response: {str(e)}")
-            return "Unable to explain the API response."
+            for chunk in stream:
+                parts.append(chunk['message']['content'])
+                yield parts[-1]
+            # Only complete explanations are cached
+            self.llm_cache.put(key, "".join(parts))
+        except Exception:
+            logger.exception("Error explaining API response")
+            # Don't append the fallback to a partially streamed explanation
+            if parts:
+                yield "\n\n*(Explanation interrupted.)*"
+            else:
+                yield "Unable to explain the API response."
+
+    def explain_api_response(self, api_response):
+        """Explain API response in plain English."""
+        return "".join(self.explain_api_response_stream(api_response)).strip()
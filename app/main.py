@@ -4,24 +4,86 @@ from app.file_processor import FileProcessor
 from app.llm_handler import LLMHandler
 import json
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+import os
 import re
+import threading
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+# Set up logging; LOG_LEVEL=WARNING silences the per-request INFO logs, unknown names mean INFO
+log_level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+logging.basicConfig(level=log_level if isinstance(log_level, int) else logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+# Splits "Tool called: <name>\nResult: <result>" responses from LLMHandler
+TOOL_RESULT_RE = re.compile(r"Tool called: (.*?)\nResult: (.*)", re.DOTALL)
+# Matches {param} placeholders in an API path template
+PATH_PARAM_RE = re.compile(r'\{([^{}]+)\}')
+# (connect, read) seconds for tool calls, so a hung API can't block the script forever
+REQUEST_TIMEOUT = (5, 30)
+
+def get_db():
+    """Return this session's database, reconnecting if its connection was closed.
+
+    psycopg2 runs every transaction on a connection together, so sessions
+    must not share one.
+    """
+    db = st.session_state.get('db')
+    if db is None:
+        db = st.session_state['db'] = Database()
+        db.init_db()
+    elif db.reconnect_if_closed():
+        # The database may have been recreated by reset.py
+        db.init_db()
+    return db
+
+@st.cache_resource
+def get_processor():
+    """Create the file processor once per process."""
+    return FileProcessor()
+
+@st.cache_data(ttl=60)
+def list_uploaded_files(_db):
+    """Uploaded file records, cached so reruns don't query Postgres each time."""
+    return [dict(row) for row in _db.get_uploaded_files()]
+
+@st.cache_resource
+def preload_models(_llm):
+    """Warm the Ollama models once per process, in the background so the first render isn't blocked."""
+    def run():
+        if not _llm.preload():
+            # Ollama was unreachable; let a later rerun try again
+            preload_models.clear()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
 
 def main():
     st.set_page_config(page_title="API Analyzer", layout="wide")
     
-    # Initialize components
-    db = Database()
-    db.init_db()
-    processor = FileProcessor()
-    llm = LLMHandler()
+    # Initialize components; reruns reuse them instead of reconnecting
+    db = get_db()
+    processor = get_processor()
+    # The handler caches the prompt for the session's tools, so keep one per session
+    if 'llm' not in st.session_state:
+        st.session_state['llm'] = LLMHandler(db)
+    llm = st.session_state['llm']
+    preload_models(llm)
     # Tool registry for dynamic tools, stored in session state
     if 'tool_registry' not in st.session_state:
         st.session_state['tool_registry'] = {}
     tool_registry = st.session_state['tool_registry']
+    # Shared HTTP session so tool calls reuse pooled keep-alive connections
+    if 'http_session' not in st.session_state:
+        http_session = requests.Session()
+        # Keep more idle connections per host than the default of 10
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+        http_session.mount('http://', adapter)
+        http_session.mount('https://', adapter)
+        # Every tool call sends and expects JSON
+        http_session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+        st.session_state['http_session'] = http_session
+    http_session = st.session_state['http_session']
 
     # Tabs
     tab1, tab2 = st.tabs(["Upload Files", "API Testing"])
@@ -31,52 +93,64 @@ def main():
         st.header("Upload YAML Files")
         
         # Display existing files
-        files = db.get_uploaded_files()
+        files = list_uploaded_files(db)
         st.subheader("Uploaded Files")
         for file in files:
             st.write(f"{file['filename']} - {file['upload_timestamp']}")
 
         # File upload
-        uploaded_file = st.file_uploader("Upload YAML/YML file", type=['yaml', 'yml'])
+        uploaded_file = st.file_uploader("Upload YAML/YML or JSON file", type=['yaml', 'yml', 'json'])
         if uploaded_file and st.button("Process File"):
             with st.spinner("Processing file..."):
                 apis, filename = processor.process_uploaded_file(uploaded_file)
-                file_id = db.save_file_record(filename)
-                for api in apis:
-                    db.save_api_data(file_id, api)
+                db.save_file_with_apis(filename, apis)
+                list_uploaded_files.clear()
                 # --- Tool creation logic: create and register tools for each API ---
                 for api in apis:
                     def make_tool(api_def):
+                        # The URL template and parameter names are fixed per tool, so compute them once
+                        has_path_params = PATH_PARAM_RE.search(api_def['full_path']) is not None
+                        param_set = frozenset(p['name'] for p in api_def['parameters'])
                         def tool_func(**kwargs):
                             url = api_def['full_path']
                             method = api_def['method']
                             # Prepare parameters
-                            params = {k: v for k, v in kwargs.items() if k in [p['name'] for p in api_def['parameters']]}
+                            params = {k: v for k, v in kwargs.items() if k in param_set}
                             data = kwargs.get('request_body', None)
-                            # Substitute path parameters in the URL
-                            path_param_names = re.findall(r'\{([^{}]+)\}', url)
-                            for pname in path_param_names:
-                                if pname in params:
-                                    url = url.replace(f'{{{pname}}}', str(params[pname]))
-                                    logging.info(f"Substituted path param: {pname}={params[pname]}")
-                                    params.pop(pname)
-                            headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
-                            logging.info(f"Final request: {method} {url} | params={params} | data={data}")
-                            resp = requests.request(method, url, headers=headers, params=params, json=data)
+                            # Substitute path parameters in one pass over the URL; unknown placeholders stay as-is
+                            if has_path_params:
+                                used = set()
+                                def substitute(match):
+                                    pname = match.group(1)
+                                    if pname not in params:
+                                        return match.group(0)
+                                    used.add(pname)
+                                    return str(params[pname])
+                                url = PATH_PARAM_RE.sub(substitute, url)
+                                # Substituted values are not sent again as query parameters
+                                for pname in used:
+                                    value = params.pop(pname)
+                                    logger.info("Substituted path param: %s=%s", pname, value)
+                            logger.info("Final request: %s %s | params=%s | data=%s", method, url, params, data)
+                            resp = http_session.request(method, url, params=params, json=data, timeout=REQUEST_TIMEOUT)
                             try:
                                 body = resp.json()
                             except Exception:
                                 body = resp.text
                             return {"status_code": resp.status_code, "headers": dict(resp.headers), "body": body}
                         tool_func.__api_metadata__ = api_def
+                        # Parameter schemas by name, used by LLMHandler to cast argument types
+                        tool_func.__param_schemas__ = {p['name']: p.get('schema', {}) for p in api_def['parameters']}
                         return tool_func
                     tool_name = api.get('operation_id') or f"{api['method']}_{api['name'].replace('/', '_')}"
-                    param_names = [p['name'] for p in api['parameters']]
-                    has_request_body = bool(api.get('request_body')) and api['request_body'] != '{}'
-                    log_msg = f"Tool registered: {tool_name}\n  Method: {api['method']}\n  Path: {api['full_path']}\n  OperationId: {api.get('operation_id')}\n  Parameters: {param_names}"
-                    if has_request_body:
-                        log_msg += f"\n  Request Body Schema: {api['request_body']}"
-                    logging.info(log_msg)
+                    # Skip building the (potentially large) registration message when INFO is off
+                    if logger.isEnabledFor(logging.INFO):
+                        param_names = [p['name'] for p in api['parameters']]
+                        has_request_body = bool(api.get('request_body')) and api['request_body'] != '{}'
+                        log_msg = f"Tool registered: {tool_name}\n  Method: {api['method']}\n  Path: {api['full_path']}\n  OperationId: {api.get('operation_id')}\n  Parameters: {param_names}"
+                        if has_request_body:
+                            log_msg += f"\n  Request Body Schema: {api['request_body']}"
+                        logger.info(log_msg)
                     tool_registry[tool_name] = make_tool(api)
                 st.session_state['tool_registry'] = tool_registry
                 st.success("File processed and tools created successfully!")
@@ -86,48 +160,49 @@ def main():
     with tab2:
         st.header("API Execution")
         
-        # Get user query
-        user_query = st.text_input("Enter your query:", key="api_test_query")
+        # Get user query; the form only reruns the script on submit, not on every edit
+        with st.form("query_form"):
+            user_query = st.text_input("Enter your query:", key="api_test_query")
+            submitted = st.form_submit_button("Run Query")
         
         if user_query:
-            with st.spinner("Processing query..."):
-                # Pass dynamic tools from session state to LLMHandler
-                response_text = llm.get_response(user_query, tools=st.session_state['tool_registry'])
-                # Defensive: Handle None response gracefully
-                if response_text is None:
-                    st.error("No response returned from LLM. Please check logs or try again.")
-                elif response_text.startswith("Tool called:"):
-                    # Parse tool name and API result
-                    tool_match = re.search(r"Tool called: (.*?)\nResult: (.*)", response_text, re.DOTALL)
-                    if tool_match:
-                        tool_name = tool_match.group(1)
-                        api_result_raw = tool_match.group(2)
-                        try:
-                            # Try to parse as JSON (Python dict with single quotes is not valid JSON)
-                            api_result = json.loads(api_result_raw)
-                        except json.JSONDecodeError:
-                            try:
-                                # Replace single quotes with double quotes and try again
-                                api_result = json.loads(api_result_raw.replace("'", '"'))
-                            except Exception:
-                                # As a last resort, try eval (unsafe for untrusted input)
-                                import ast
-                                try:
-                                    api_result = ast.literal_eval(api_result_raw)
-                                except Exception:
-                                    api_result = api_result_raw
-                        st.subheader("API Response")
-                        st.write(f"**Tool:** {tool_name}")
-                        st.json(api_result)
-                        # Pass the API result to LLM for user-friendly explanation
-                        with st.spinner("Summarizing response..."):
-                            explanation = llm.explain_api_response(api_result if isinstance(api_result, dict) else {'body': api_result})
-                            st.subheader("Response Explanation")
-                            st.write(explanation)
-                    else:
-                        st.write(response_text)
+            # Only Run Query executes the query; other reruns (widgets, uploads) just
+            # redisplay the last answer so a tool call, and any write it makes, never repeats
+            query_key = ' '.join(user_query.split())
+            if submitted:
+                with st.spinner("Processing query..."):
+                    # Pass dynamic tools from session state to LLMHandler
+                    response_text = llm.get_response(user_query, tools=st.session_state['tool_registry'])
+                st.session_state['last_query_response'] = (query_key, response_text)
+            last_key, response_text = st.session_state.get('last_query_response', (None, None))
+            if last_key != query_key:
+                # This query hasn't been run yet; wait for Run Query
+                pass
+            # Defensive: Handle None response gracefully
+            elif response_text is None:
+                st.error("No response returned from LLM. Please check logs or try again.")
+            elif response_text.startswith("Tool called:"):
+                # Parse tool name and API result
+                tool_match = TOOL_RESULT_RE.search(response_text)
+                if tool_match:
+                    tool_name = tool_match.group(1)
+                    api_result_raw = tool_match.group(2)
+                    try:
+                        # LLMHandler serializes tool results as JSON
+                        api_result = json.loads(api_result_raw)
+                    except json.JSONDecodeError:
+                        # Show anything else as plain text
+                        api_result = api_result_raw
+                    st.subheader("API Response")
+                    st.write(f"**Tool:** {tool_name}")
+                    st.json(api_result)
+                    # Pass the API result to LLM for user-friendly explanation
+                    st.subheader("Response Explanation")
+                    st.write_stream(llm.explain_api_response_stream(api_result if isinstance(api_result, dict) else {'body': api_result}))
                 else:
                     st.write(response_text)
+            else:
+                st.write(response_text)
 
     # Debug: Show tool registry in UI
     st.sidebar.subheader("Registered Tools (Debug)")
@@ -1,12 +1,14 @@
 import os
 import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
-# Set up logging
+# Set up logging; the level can be overridden with LOG_LEVEL, unknown names mean INFO
+log_level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
 logging.basicConfig(
-    level=logging.INFO,
+    level=log_level if isinstance(log_level, int) else logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
@@ -25,13 +27,13 @@ def reset_uploads():
     if os.path.exists(uploads_folder_path):
         try:
             shutil.rmtree(uploads_folder_path)
-            logger.info(f"Successfully deleted uploads folder at {uploads_folder_path}")
+            logger.info("Successfully deleted uploads folder at %s", uploads_folder_path)
             return True
         except Exception as e:
-            logger.error(f"Failed to delete uploads folder: {e}")
+            logger.error("Failed to delete uploads folder: %s", e)
             return False
     else:
-        logger.info(f"Uploads folder not found at {uploads_folder_path}, nothing to delete")
+        logger.info("Uploads folder not found at %s, nothing to delete", uploads_folder_path)
         return True
 
 def reset_postgres_db():
@@ -76,17 +78,18 @@ def reset_postgres_db():
         return True
         
     except Exception as e:
-        logger.error(f"Failed to reset PostgreSQL database: {e}")
+        logger.error("Failed to reset PostgreSQL database: %s", e)
         return False
 
 if __name__ == "__main__":
     print("Resetting database, prior uploads and starting fresh...")
     
-    # Reset PostgreSQL database
-    postgres_reset = reset_postgres_db()
-    
-    # Reset uploads folder  
-    uploads_reset = reset_uploads()
+    # The database and the uploads folder are independent, so reset them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        postgres_future = executor.submit(reset_postgres_db)
+        uploads_future = executor.submit(reset_uploads)
+    postgres_reset = postgres_future.result()
+    uploads_reset = uploads_future.result()
 
     if postgres_reset and uploads_reset:
         print("Database reset successfully!")